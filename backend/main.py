@@ -5,27 +5,101 @@ AI Document Authenticity Scanner - Hybrid AI + Heuristic Backend
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import io
 import os
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import httpx
 import numpy as np
-import requests
-import base64
-from PIL import Image, ImageStat
+import orjson
+from PIL import Image
 from datetime import datetime
 import pypdfium2 as pdfium
+import xxhash
 
 # ==============================
-# 🔐 YOUR CREDENTIALS
+# 🔐 CREDENTIALS
 # ==============================
-API_USER = "301528576"
-API_SECRET = "zWH9kRpV8uZezQqkUnkqx3fRqPcZiAah"
+# Read from SIGHTENGINE_API_USER / SIGHTENGINE_API_SECRET at call time
 AI_DETECTOR_URL = "https://api.sightengine.com/1.0/check.json"
 # ==============================
 
+# Metadata anomaly added for an image's (format, mode) pair
+FORMAT_MODE_SCORES = {("PNG", "RGB"): 0.1, ("WEBP", "RGB"): 0.1}
+
+# Long edge (px) and JPEG quality of the image sent to the detector
+AI_UPLOAD_MAX_SIDE = 1024
+AI_UPLOAD_JPEG_QUALITY = 80
+
+# Long edge (px) the pixel heuristics are computed at
+ANALYSIS_MAX_SIDE = 512
+# Images with a shorter side than this get neutral pixel-heuristic scores
+MIN_ANALYSIS_SIDE = 16
+# Long edge (px) uploads are decoded at: PDF pages are rasterized to it
+# (never above scale 2) and large JPEGs are DCT-downscaled towards it
+DECODE_MAX_SIDE = 1024
+# Uploads above this size are rejected with 413
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Accepted image MIME types (PDFs are handled separately)
+IMAGE_CONTENT_TYPES = ["image/jpeg", "image/png", "image/webp", "image/jpg"]
+# Number of /analyze responses kept, keyed by upload content hash, and
+# how long (s) each stays valid
+RESULT_CACHE_SIZE = 4096
+RESULT_CACHE_TTL = 3600
+# Detector probabilities kept, keyed the same way; they outlive the
+# verdicts so a re-scan after expiry does not pay for another API call
+AI_CACHE_SIZE = 10000
+AI_CACHE_TTL = 86400
+# Files accepted per /analyze_batch call, and how many run at once
+MAX_BATCH_FILES = 50
+BATCH_CONCURRENCY = 16
+# Pixel heuristics estimate their statistics from at most this many
+# pixels (compression) and 8x8 tiles (noise), drawn from a fixed seed so
+# an image always scores the same
+COMPRESSION_SAMPLE_PIXELS = 16384
+NOISE_SAMPLE_TILES = 1024
+SAMPLE_SEED = 0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per worker keeps the TLS connection to Sightengine
+    # warm and multiplexes concurrent uploads over HTTP/2.
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=15,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    # pdfium is not thread-safe. All renders go through one dedicated
+    # thread, so queued PDFs wait there instead of tying up default-pool
+    # threads on a lock.
+    app.state.pdf_executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="pdfium"
+    )
+    yield
+    await app.state.http.aclose()
+    app.state.pdf_executor.shutdown(wait=False)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse serialized by orjson, which also encodes NumPy scalars
+    natively. (FastAPI's own ORJSONResponse is deprecated.)"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
 app = FastAPI(
     title="Document Authenticity Scanner API",
     description="Hybrid AI + Heuristic document verification",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -37,47 +111,190 @@ app.add_middleware(
 )
 
 
+# ==============================
+# Metadata parsing
+# ==============================
+def _exif_field_count(raw) -> int:
+    """Number of IFD0 entries in a raw EXIF block, read from its TIFF
+    header without parsing the tags (what len(image.getexif()) counts)."""
+    if not raw:
+        return 0
+    if raw.startswith(b"Exif\x00\x00"):
+        raw = raw[6:]
+    if len(raw) < 8 or raw[:2] not in (b"II", b"MM"):
+        return 0
+
+    order = "<" if raw[:2] == b"II" else ">"
+    (ifd_offset,) = struct.unpack_from(order + "I", raw, 4)
+    if ifd_offset + 2 > len(raw):
+        return 0
+    (count,) = struct.unpack_from(order + "H", raw, ifd_offset)
+    return count
+
+
+# ==============================
+# Pixel kernels
+# ==============================
+def _sobel_gradients(padded: np.ndarray):
+    # The two 3x3 Sobel kernels are the same separable pair, a [-1, 0, 1]
+    # difference and a [1, 2, 1] smoothing, transposed. A single horizontal
+    # pass yields both row-filtered images; each gradient then needs only
+    # one vertical pass over one of them.
+    diff = padded[:, 2:] - padded[:, :-2]
+    smooth = padded[:, :-2] + 2 * padded[:, 1:-1] + padded[:, 2:]
+
+    edges_x = diff[:-2] + 2 * diff[1:-1] + diff[2:]
+    edges_y = smooth[2:] - smooth[:-2]
+    return edges_x, edges_y
+
+
+def _edge_moments(gray: np.ndarray):
+    """Mean and population variance of the Sobel gradient magnitude of a
+    2-D uint8 image, edge-replicated."""
+    # Responses of a uint8 image are bounded by 4 * 255, so int16 holds
+    # them exactly at a quarter of the float64 footprint.
+    padded = np.pad(gray, 1, mode="edge").astype(np.int16)
+    edges_x, edges_y = _sobel_gradients(padded)
+
+    # |G|^2 <= 2 * 1020^2 is exact in int32, which gives the second moment
+    # without a float pass; only the mean needs the square root.
+    magnitude_sq = np.square(edges_x, dtype=np.int32)
+    magnitude_sq += np.square(edges_y, dtype=np.int32)
+    total_sq = magnitude_sq.sum(dtype=np.int64)
+    total = np.sqrt(magnitude_sq, dtype=np.float32).sum(dtype=np.float64)
+
+    n = magnitude_sq.size
+    mean = total / n
+    return mean, max(total_sq / n - mean * mean, 0.0)
+
+
+def _sample_positions(population: int, size: int):
+    """Sorted, reproducible random positions in range(population), or None
+    when the population is no larger than the sample."""
+    if population <= size:
+        return None
+    rng = np.random.default_rng(SAMPLE_SEED)
+    positions = rng.integers(0, population, size=size)
+    # Ascending order keeps the gathers below moving forward through memory
+    positions.sort()
+    return positions
+
+
+def _block_variances(gray: np.ndarray, window_size: int, max_tiles=None):
+    """Per-tile variance of a 2-D uint8 image cropped to whole tiles, over
+    a random subset of at most max_tiles tiles when given."""
+    h, w = gray.shape
+    h -= h % window_size
+    w -= w % window_size
+    n = window_size * window_size
+    grid = gray[:h, :w].reshape(
+        h // window_size, window_size, w // window_size, window_size
+    )
+
+    # Gather each tile into one contiguous row so the reductions below run
+    # along the innermost axis.
+    positions = None
+    if max_tiles is not None:
+        positions = _sample_positions(grid.shape[0] * grid.shape[2], max_tiles)
+    if positions is None:
+        tiles = grid.swapaxes(1, 2).reshape(-1, n)
+    else:
+        rows, cols = np.divmod(positions, grid.shape[2])
+        tiles = grid[rows, :, cols, :].reshape(-1, n)
+
+    # For uint8 pixels, squares fit in uint16 and per-tile sums in uint32
+    # (exact up to 256x256 tiles). The moments are therefore exact and no
+    # float64 copy of the image is made.
+    sums = tiles.sum(axis=1, dtype=np.uint32)
+    sq_sums = np.square(tiles, dtype=np.uint16).sum(axis=1, dtype=np.uint32)
+
+    mean = sums / n
+    return sq_sums / n - mean * mean
+
+
+def _channel_stddev(rgb: np.ndarray, max_pixels=None) -> np.ndarray:
+    """Population standard deviation of each of the first three channels
+    of an H x W x C uint8 image, over a random subset of at most
+    max_pixels pixels when given."""
+    pixels = rgb.reshape(-1, rgb.shape[2])[:, :3]
+    if max_pixels is not None:
+        positions = _sample_positions(pixels.shape[0], max_pixels)
+        if positions is not None:
+            pixels = pixels[positions]
+
+    # Reducing an interleaved image over its pixel axis strides through
+    # memory; one planar copy keeps every reduction contiguous.
+    planes = pixels.T.copy()
+    n = planes.shape[1]
+
+    # Integer moments as in _block_variances, accumulated in uint64 since
+    # whole-image sums of squares outgrow uint32.
+    sums = planes.sum(axis=1, dtype=np.uint64)
+    sq_sums = np.square(planes, dtype=np.uint16).sum(axis=1, dtype=np.uint64)
+
+    mean = sums / n
+    return np.sqrt(np.maximum(sq_sums / n - mean * mean, 0.0))
+
+
 class DocumentAnalyzer:
+    # analyze_ai_model's answer when no Sightengine credentials are set
+    NOT_CONFIGURED = object()
+
     def __init__(self):
         self.ai_patterns = {
             "noise_threshold": 0.15,
             "edge_variance_threshold": 0.25,
+            # Camera JPEGs carry far more EXIF tags than generator output
+            "camera_exif_fields": 10,
         }
 
     # -------------------------
     # AI MODEL DETECTION
     # -------------------------
-    def analyze_ai_model(self, image: Image.Image):
-    try:
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        buffered.seek(0)
-
-        response = requests.post(
-            "https://api.sightengine.com/1.0/check.json",
-            files={"media": ("image.jpg", buffered, "image/jpeg")},
-            data={
-                "models": "genai",
-                "api_user": "301528576",
-                "api_secret": "zWH9kRpV8uZezQqkUnkqx3fRqPcZiAah"
-            },
-            timeout=15
-        )
+    async def analyze_ai_model(self, image: Image.Image, client: httpx.AsyncClient):
+        """Detector probability that the image is AI-generated, None when the
+        request failed, or NOT_CONFIGURED without credentials."""
+        api_user = os.environ.get("SIGHTENGINE_API_USER")
+        api_secret = os.environ.get("SIGHTENGINE_API_SECRET")
+        if not api_user or not api_secret:
+            return self.NOT_CONFIGURED
+
+        try:
+            # JPEG encoding is CPU-bound; keep it off the event loop
+            payload = await asyncio.to_thread(self._encode_upload, image)
+
+            response = await client.post(
+                AI_DETECTOR_URL,
+                files={"media": ("image.jpg", payload, "image/jpeg")},
+                data={
+                    "models": "genai",
+                    "api_user": api_user,
+                    "api_secret": api_secret
+                }
+            )
+
+            if response.status_code == 200:
+                result = response.json()
 
-        if response.status_code == 200:
-            result = response.json()
+                # Sightengine returns something like:
+                # result["type"]["ai_generated"]
+                ai_probability = result.get("type", {}).get("ai_generated", 0.5)
 
-            # Sightengine returns something like:
-            # result["type"]["ai_generated"]
-            ai_probability = result.get("type", {}).get("ai_generated", 0.5)
+                return float(ai_probability)
 
-            return float(ai_probability)
+        except Exception:
+            pass
 
-    except Exception:
-        pass
+        return None
 
-    return 0.5
- # fallback neutral
+    def _encode_upload(self, image: Image.Image):
+        # The genai model does not need more than ~1024px, so bound the
+        # size before encoding; that cuts both libjpeg work and upload bytes
+        buffered = io.BytesIO()
+        self.downscale(image, AI_UPLOAD_MAX_SIDE).save(
+            buffered, format="JPEG", quality=AI_UPLOAD_JPEG_QUALITY
+        )
+        return buffered.getvalue()
 
     # -------------------------
     # Metadata Analysis
@@ -90,40 +307,34 @@ class DocumentAnalyzer:
             "filename": filename
         }
 
-        exif = image.getexif()
-        metadata["has_exif"] = bool(exif)
-        metadata["exif_fields"] = len(exif) if exif else 0
-
-        anomaly_score = 0.0
+        metadata["exif_fields"] = _exif_field_count(image.info.get("exif"))
+        metadata["has_exif"] = metadata["exif_fields"] > 0
 
-        if not metadata["has_exif"]:
-            anomaly_score += 0.3
-
-        if metadata["mode"] == "RGB" and metadata["format"] in ["PNG", "WEBP"]:
-            anomaly_score += 0.1
+        anomaly_score = 0.0 if metadata["has_exif"] else 0.3
+        anomaly_score += FORMAT_MODE_SCORES.get((image.format, image.mode), 0.0)
 
         return metadata, min(anomaly_score, 1.0)
 
+    def is_camera_capture(self, metadata: dict, metadata_score: float):
+        """Whether the metadata alone marks a camera JPEG, whose pixel
+        heuristics are then not worth computing."""
+        return (
+            metadata_score == 0
+            and metadata["format"] == "JPEG"
+            and metadata["exif_fields"] > self.ai_patterns["camera_exif_fields"]
+        )
+
     # -------------------------
     # Noise Analysis
     # -------------------------
-    def analyze_noise_patterns(self, image: Image.Image):
-        gray = image.convert("L")
-        img_array = np.array(gray)
-
-        window_size = 8
-        variances = []
-
-        h, w = img_array.shape
-
-        for i in range(0, h - window_size, window_size):
-            for j in range(0, w - window_size, window_size):
-                window = img_array[i:i+window_size, j:j+window_size]
-                variances.append(np.var(window))
+    def analyze_noise_patterns(self, gray_arr: np.ndarray):
+        variances = _block_variances(
+            gray_arr, window_size=8, max_tiles=NOISE_SAMPLE_TILES
+        )
 
-        if variances:
-            mean_var = np.mean(variances)
-            std_var = np.std(variances)
+        if variances.size:
+            mean_var = variances.mean()
+            std_var = variances.std()
             cv = std_var / mean_var if mean_var > 0 else 0
             return 1.0 - min(cv / self.ai_patterns["noise_threshold"], 1.0)
 
@@ -132,20 +343,8 @@ class DocumentAnalyzer:
     # -------------------------
     # Edge Analysis
     # -------------------------
-    def analyze_edge_consistency(self, image: Image.Image):
-        gray = image.convert("L")
-        img_array = np.array(gray)
-
-        sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
-        sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
-
-        edges_x = self._convolve2d(img_array, sobel_x)
-        edges_y = self._convolve2d(img_array, sobel_y)
-
-        edge_magnitude = np.sqrt(edges_x**2 + edges_y**2)
-
-        edge_variance = np.var(edge_magnitude)
-        edge_mean = np.mean(edge_magnitude)
+    def analyze_edge_consistency(self, gray_arr: np.ndarray):
+        edge_mean, edge_variance = _edge_moments(gray_arr)
 
         if edge_mean > 0:
             edge_cv = edge_variance / (edge_mean ** 2)
@@ -153,33 +352,32 @@ class DocumentAnalyzer:
 
         return 0.5
 
-    def _convolve2d(self, image: np.ndarray, kernel: np.ndarray):
-        output = np.zeros_like(image, dtype=float)
-
-        k_height, k_width = kernel.shape
-        pad_h, pad_w = k_height // 2, k_width // 2
-
-        padded = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode='edge')
-
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                region = padded[i:i+k_height, j:j+k_width]
-                output[i, j] = np.sum(region * kernel)
-
-        return output
-
     # -------------------------
     # Compression Analysis
     # -------------------------
-    def analyze_compression_artifacts(self, image: Image.Image):
-        stats = ImageStat.Stat(image)
-
-        if len(stats.stddev) >= 3:
-            avg_stddev = sum(stats.stddev[:3]) / 3
+    def analyze_compression_artifacts(self, rgb: np.ndarray):
+        if rgb.ndim == 3 and rgb.shape[2] >= 3:
+            stddev = _channel_stddev(rgb, max_pixels=COMPRESSION_SAMPLE_PIXELS)
+            avg_stddev = float(stddev.mean())
             return 1.0 - min(avg_stddev / 50.0, 1.0)
 
         return 0.5
 
+    def downscale(self, image: Image.Image, max_side: int = ANALYSIS_MAX_SIDE):
+        # Bound the long edge to max_side. Every heuristic reduces to a
+        # scale-normalised ratio, so a bounded thumbnail carries the same
+        # signal as the full-resolution render.
+        width, height = image.size
+        factor = max_side / max(width, height)
+        if factor >= 1:
+            return image
+
+        # Resize straight from the source instead of thumbnail() on a
+        # full-resolution copy; reducing_gap box-reduces first, as
+        # thumbnail() does.
+        size = (max(1, round(width * factor)), max(1, round(height * factor)))
+        return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
     # -------------------------
     # HYBRID SCORING
     # -------------------------
@@ -224,69 +422,282 @@ class DocumentAnalyzer:
 analyzer = DocumentAnalyzer()
 
 
-@app.post("/analyze")
-async def analyze_document(file: UploadFile = File(...)):
-    try:
-        contents = await file.read()
-
-        if file.content_type == "application/pdf":
-            pdf_file = io.BytesIO(contents)
-            pdf = pdfium.PdfDocument(pdf_file)
-
-            if len(pdf) == 0:
-                raise HTTPException(status_code=400, detail="PDF has no pages")
-
-            page = pdf[0]
-            pil_image = page.render(scale=2).to_pil()
-            pdf.close()
-
-        elif file.content_type in [
-            "image/jpeg",
-            "image/png",
-            "image/webp",
-            "image/jpg"
-        ]:
-            pil_image = Image.open(io.BytesIO(contents))
-        else:
+class _TTLCache:
+    """Bounded LRU mapping whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_result_cache = _TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+_ai_cache = _TTLCache(AI_CACHE_SIZE, AI_CACHE_TTL)
+
+# The analysis task running for each content hash, so concurrent
+# identical uploads share its verdict, cached or not, instead of each
+# running the pipeline again
+_inflight = {}
+
+
+async def _hash_upload(file: UploadFile):
+    """Stream through the spooled upload once, enforcing MAX_UPLOAD_BYTES
+    and returning its xxh3 content hash."""
+    digest = xxhash.xxh3_64()
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
             raise HTTPException(
-                status_code=400,
-                detail="Unsupported file type"
+                status_code=413,
+                detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
             )
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+def _render_pdf_first_page(pdf_file):
+    """Rasterize the first page of a PDF. Blocking; run it on the app's
+    single-threaded pdf_executor."""
+    pdf = pdfium.PdfDocument(pdf_file)
+    try:
+        if len(pdf) == 0:
+            raise HTTPException(status_code=400, detail="PDF has no pages")
+
+        page = pdf[0]
+        width, height = page.get_size()
+        scale = min(2.0, DECODE_MAX_SIDE / max(width, height))
+        return page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+
+
+def _draft_jpeg(image: Image.Image):
+    # Ask libjpeg to decode at the smallest 1/2, 1/4 or 1/8 DCT scale that
+    # keeps the long edge at or above DECODE_MAX_SIDE; must run before load.
+    width, height = image.size
+    factor = DECODE_MAX_SIDE / max(width, height)
+    if factor < 1:
+        image.draft(
+            "RGB",
+            (max(1, int(width * factor)), max(1, int(height * factor)))
+        )
 
-        if pil_image.mode != "RGB":
-            pil_image = pil_image.convert("RGB")
 
-        metadata, metadata_score = analyzer.analyze_metadata(
-            pil_image, file.filename
+def _load_rgb(pil_image: Image.Image):
+    """Decode an opened upload to RGB. Blocking; call it off the event loop."""
+    if pil_image.mode != "RGB":
+        return pil_image.convert("RGB")
+    pil_image.load()
+    return pil_image
+
+
+def _run_heuristics(pil_image: Image.Image):
+    """Noise, edge and compression scores of a decoded upload. Blocking;
+    call it off the event loop."""
+    if min(pil_image.size) < MIN_ANALYSIS_SIDE:
+        # Too few pixels for the statistics to mean anything
+        return 0.5, 0.5, 0.5
+
+    # Downscale and take the pixel arrays once for all pixel heuristics
+    analysis_image = analyzer.downscale(pil_image)
+    rgb_arr = np.asarray(analysis_image)
+    gray_arr = np.asarray(analysis_image.convert("L"))
+
+    return (
+        analyzer.analyze_noise_patterns(gray_arr),
+        analyzer.analyze_edge_consistency(gray_arr),
+        analyzer.analyze_compression_artifacts(rgb_arr),
+    )
+
+
+async def _ai_probability(
+    pil_image: Image.Image, content_hash: str, client: httpx.AsyncClient
+):
+    """Detector probability for an upload, reusing an earlier answer for the
+    same content, and whether a verdict built on it may be cached. Only
+    one analysis runs per content hash at a time, so concurrent duplicates
+    never reach the detector twice."""
+    ai_probability = _ai_cache.get(content_hash)
+    if ai_probability is not None:
+        return ai_probability, True
+
+    ai_probability = await analyzer.analyze_ai_model(pil_image, client)
+    if ai_probability is analyzer.NOT_CONFIGURED:
+        # Neutral, and stays so until credentials are set
+        return 0.5, True
+    if ai_probability is None:
+        # Fallback neutral for a failed request, which a later upload retries
+        return 0.5, False
+
+    _ai_cache.put(content_hash, ai_probability)
+    return ai_probability, True
+
+
+async def _analyze_image(
+    pil_image: Image.Image,
+    filename: str,
+    content_hash: str,
+    client: httpx.AsyncClient
+):
+    """Score an opened upload, returning the verdict, the detector's
+    probability and whether the verdict may be cached."""
+    pil_image = await asyncio.to_thread(_load_rgb, pil_image)
+
+    metadata, metadata_score = analyzer.analyze_metadata(pil_image, filename)
+
+    if analyzer.is_camera_capture(metadata, metadata_score):
+        # Short-circuit: a camera JPEG with a full EXIF block skips the
+        # pixel heuristics. EXIF is uploader-controlled, so the skipped
+        # stages score neutral and the detector still decides.
+        noise_score = edge_score = compression_score = 0.5
+        ai_probability, cacheable = await _ai_probability(
+            pil_image, content_hash, client
         )
+    else:
+        # 🔥 AI MODEL CALL runs while the heuristics use a worker thread
+        heuristic_scores, (ai_probability, cacheable) = await asyncio.gather(
+            asyncio.to_thread(_run_heuristics, pil_image),
+            _ai_probability(pil_image, content_hash, client),
+        )
+        noise_score, edge_score, compression_score = heuristic_scores
+
+    result = analyzer.calculate_authenticity_score(
+        metadata_score,
+        noise_score,
+        edge_score,
+        compression_score,
+        ai_probability
+    )
 
-        noise_score = analyzer.analyze_noise_patterns(pil_image)
-        edge_score = analyzer.analyze_edge_consistency(pil_image)
-        compression_score = analyzer.analyze_compression_artifacts(pil_image)
+    return result, ai_probability, cacheable
 
-        # 🔥 AI MODEL CALL
-        ai_probability = analyzer.analyze_ai_model(pil_image)
 
-        result = analyzer.calculate_authenticity_score(
-            metadata_score,
-            noise_score,
-            edge_score,
-            compression_score,
-            ai_probability
+async def _analyze_upload(file: UploadFile, content_hash: str):
+    """Decode and score an upload whose type and size were checked,
+    returning the response and whether it may be cached."""
+    # Decode straight from the spooled upload instead of copying it
+    # into memory first.
+    if file.content_type == "application/pdf":
+        pil_image = await asyncio.get_running_loop().run_in_executor(
+            app.state.pdf_executor, _render_pdf_first_page, file.file
         )
+    else:
+        pil_image = Image.open(file.file)
+        if pil_image.format == "JPEG":
+            _draft_jpeg(pil_image)
+
+    result, ai_probability, cacheable = await _analyze_image(
+        pil_image, file.filename, content_hash, app.state.http
+    )
+
+    return {
+        "score": result["score"],
+        "label": result["label"],
+        "confidence": result["confidence"],
+        "ai_model_probability": round(ai_probability * 100, 1),
+        "analyzed_at": datetime.now().isoformat()
+    }, cacheable
+
+
+async def _analyze_file(file: UploadFile):
+    """Validate, deduplicate and score one upload. Raises HTTPException for
+    rejected uploads."""
+    if (
+        file.content_type != "application/pdf"
+        and file.content_type not in IMAGE_CONTENT_TYPES
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file type"
+        )
+
+    content_hash = await _hash_upload(file)
+
+    # Identical uploads (UI retries, batch re-scans) reuse the verdict;
+    # concurrent ones await the first one's run instead of racing it
+    response = _result_cache.get(content_hash)
+    if response is not None:
+        return response
+
+    task = _inflight.get(content_hash)
+    if task is None:
+        task = asyncio.create_task(_analyze_and_cache(file, content_hash))
+        _inflight[content_hash] = task
+        task.add_done_callback(lambda _: _inflight.pop(content_hash, None))
+
+    # Shielded so one client going away does not cancel the shared run
+    return await asyncio.shield(task)
+
+
+async def _analyze_and_cache(file: UploadFile, content_hash: str):
+    """Score an upload and keep the verdict when it may be cached."""
+    response, cacheable = await _analyze_upload(file, content_hash)
+    # A verdict built on a failed detector call is not kept, so the next
+    # upload of these bytes asks the detector again
+    if cacheable:
+        _result_cache.put(content_hash, response)
+    return response
 
-        return JSONResponse(content={
-            "score": result["score"],
-            "label": result["label"],
-            "confidence": result["confidence"],
-            "ai_model_probability": round(ai_probability * 100, 1),
-            "analyzed_at": datetime.now().isoformat()
-        })
 
+@app.post("/analyze")
+async def analyze_document(file: UploadFile = File(...)):
+    try:
+        return ORJSONResponse(content=await _analyze_file(file))
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/analyze_batch")
+async def analyze_batch(files: list[UploadFile] = File(...)):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_FILES} files per batch"
+        )
+
+    # Bound in-flight analyses; detector calls share the pooled client
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyze_one(file: UploadFile):
+        async with semaphore:
+            try:
+                return {"filename": file.filename, **await _analyze_file(file)}
+            except HTTPException as e:
+                return {"filename": file.filename, "error": e.detail}
+            except Exception as e:
+                return {"filename": file.filename, "error": str(e)}
+
+    results = await asyncio.gather(*(analyze_one(file) for file in files))
+    return ORJSONResponse(content={"results": results})
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -295,4 +706,17 @@ async def health_check():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Extra worker processes run CPU-bound analyses in parallel, each with
+    # its own pdfium. The result cache, in-flight dedup and HTTP client are
+    # per worker. "auto" picks uvloop/httptools where they are installed.
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        limit_concurrency=256,
+        backlog=2048
+    )
@@ -0,0 +1,151 @@
+import io
+import struct
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+from main import app
+
+
+def _jpeg(width, height):
+    buffered = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 80, 40)).save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    main._result_cache.clear()
+    main._ai_cache.clear()
+    yield
+    main._result_cache.clear()
+    main._ai_cache.clear()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def detector(client, monkeypatch):
+    """Route detector requests to the handlers appended to the yielded
+    list, one per call; the last is reused."""
+    monkeypatch.setenv("SIGHTENGINE_API_USER", "user")
+    monkeypatch.setenv("SIGHTENGINE_API_SECRET", "secret")
+    handlers = []
+    calls = []
+
+    def handle(request):
+        calls.append(request)
+        return handlers[min(len(calls), len(handlers)) - 1](request)
+
+    mock = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    # Restored before the client fixture's lifespan closes the real one
+    with monkeypatch.context() as patch:
+        patch.setattr(app.state, "http", mock)
+        yield handlers, calls
+    client.portal.call(mock.aclose)
+
+
+def _camera_exif():
+    exif = Image.Exif()
+    # ImageDescription, Make, Model, Software, Artist
+    for tag in (0x010E, 0x010F, 0x0110, 0x0131, 0x013B):
+        exif[tag] = "tag"
+    return exif.tobytes()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_exif_field_count_matches_getexif(fmt):
+    buffered = io.BytesIO()
+    Image.new("RGB", (16, 16)).save(buffered, format=fmt, exif=_camera_exif())
+    image = Image.open(buffered)
+    image.load()  # PNG may store eXIf after the image data
+
+    raw = image.info.get("exif")
+    assert main._exif_field_count(raw) == len(image.getexif()) == 5
+
+
+def test_exif_field_count_little_endian():
+    # TIFF header, IFD0 at offset 8 holding three 12-byte entries
+    raw = b"II*\x00" + struct.pack("<IH", 8, 3) + bytes(12 * 3 + 4)
+    assert main._exif_field_count(b"Exif\x00\x00" + raw) == 3
+    assert main._exif_field_count(raw) == 3
+
+
+@pytest.mark.parametrize("raw", [
+    None,
+    b"",
+    b"Exif\x00\x00MM\x00*",  # header cut short
+    b"MM\x00*" + struct.pack(">I", 4096),  # IFD0 offset past the end
+    b"XX\x00*" + struct.pack(">IH", 8, 3),  # bad byte-order mark
+])
+def test_exif_field_count_malformed(raw):
+    assert main._exif_field_count(raw) == 0
+
+
+def test_analyze_thin_jpeg(client):
+    for width, height in [(3000, 2), (2, 3000), (5000, 4)]:
+        response = client.post(
+            "/analyze",
+            files={"file": ("thin.jpg", _jpeg(width, height), "image/jpeg")}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["label"] in (
+            "Verified", "Suspicious", "AI Generated"
+        )
+
+
+def test_detector_failure_is_not_cached(client, detector):
+    handlers, calls = detector
+    handlers.append(lambda request: httpx.Response(503))
+    handlers.append(
+        lambda request: httpx.Response(200, json={"type": {"ai_generated": 0.9}})
+    )
+
+    upload = {"file": ("retry.jpg", _jpeg(64, 48), "image/jpeg")}
+    probabilities = [
+        client.post("/analyze", files=upload).json()["ai_model_probability"]
+        for _ in range(3)
+    ]
+
+    assert probabilities == [50.0, 90.0, 90.0]
+    assert len(calls) == 2
+
+
+def test_analyze_batch_rejects_too_many_files(client):
+    files = [
+        ("files", (f"{index}.jpg", _jpeg(16, 16), "image/jpeg"))
+        for index in range(main.MAX_BATCH_FILES + 1)
+    ]
+    response = client.post("/analyze_batch", files=files)
+    assert response.status_code == 400
+
+
+def test_analyze_batch_results(client, monkeypatch):
+    monkeypatch.delenv("SIGHTENGINE_API_USER", raising=False)
+    monkeypatch.delenv("SIGHTENGINE_API_SECRET", raising=False)
+    files = [
+        ("files", ("first.jpg", _jpeg(64, 48), "image/jpeg")),
+        ("files", ("notes.txt", b"not an image", "text/plain")),
+        ("files", ("second.jpg", _jpeg(48, 64), "image/jpeg")),
+        ("files", ("copy.jpg", _jpeg(64, 48), "image/jpeg")),
+    ]
+    response = client.post("/analyze_batch", files=files)
+    assert response.status_code == 200, response.text
+
+    results = response.json()["results"]
+    assert [result["filename"] for result in results] == [
+        "first.jpg", "notes.txt", "second.jpg", "copy.jpg"
+    ]
+    assert results[1] == {
+        "filename": "notes.txt", "error": "Unsupported file type"
+    }
+    assert "error" not in results[0] and "error" not in results[2]
+    # Identical bytes share one analysis, timestamp included
+    assert {**results[3], "filename": "first.jpg"} == results[0]